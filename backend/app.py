@@ -173,12 +173,14 @@ def health_check():
 def get_weather_probability():
     """
     Endpoint to get weather forecast probability for event planning (up to 30 days)
-    Query params: lat, lon, date (YYYY-MM-DD), days (optional, default=7, max=30)
+    Query params: lat, lon, date (YYYY-MM-DD), days (optional, default=7, max=30),
+                  mode (optional, 'forecast' or 'ensemble', default='forecast')
     """
     lat = request.args.get('lat')
     lon = request.args.get('lon')
     target_date = request.args.get('date')
     days_range = request.args.get('days', 7)
+    mode = request.args.get('mode', 'forecast')
     
     # Validate input
     if not lat or not lon or not target_date:
@@ -187,6 +189,12 @@ def get_weather_probability():
             'message': 'Latitude, longitude, and date are required'
         }), 400
     
+    if mode not in ('forecast', 'ensemble'):
+        return jsonify({
+            'error': 'Invalid mode',
+            'message': "Mode must be 'forecast' or 'ensemble'"
+        }), 400
+    
     try:
         lat_float = float(lat)
         lon_float = float(lon)
@@ -216,11 +224,16 @@ def get_weather_probability():
             'message': 'Parameters must be valid numbers'
         }), 400
     
-    # Fetch probability data using forecast
+    # Fetch probability data using forecast or ensemble members
     try:
-        probability_data = weather_service.fetch_forecast_probability(
-            lat_float, lon_float, target_date, days_int
-        )
+        if mode == 'ensemble':
+            probability_data = weather_service.fetch_ensemble_probability(
+                lat_float, lon_float, target_date, days_int
+            )
+        else:
+            probability_data = weather_service.fetch_forecast_probability(
+                lat_float, lon_float, target_date, days_int
+            )
         
         return jsonify({
             'success': True,
@@ -7,5 +7,8 @@ class Config:
     METEOMATICS_API_USERNAME = os.getenv('METEOMATICS_API_USERNAME')
     METEOMATICS_API_PASSWORD = os.getenv('METEOMATICS_API_PASSWORD')
     METEOMATICS_API_URL = os.getenv('METEOMATICS_API_URL', 'https://api.meteomatics.com')
+    METEOMATICS_ENSEMBLE_MODEL = os.getenv('METEOMATICS_ENSEMBLE_MODEL', 'ecmwf-ens')
+    METEOMATICS_ENSEMBLE_MEMBERS = int(os.getenv('METEOMATICS_ENSEMBLE_MEMBERS', '51'))
+    METEOMATICS_ENSEMBLE_HORIZON_DAYS = int(os.getenv('METEOMATICS_ENSEMBLE_HORIZON_DAYS', '15'))
     DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
     CORS_HEADERS = 'Content-Type'
\ No newline at end of file
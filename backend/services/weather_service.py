@@ -3,6 +3,8 @@ from requests.auth import HTTPBasicAuth
 from datetime import datetime, timedelta
 from config import Config
 import statistics
+import warnings
+import numpy as np
 
 class WeatherService:
     def __init__(self):
@@ -19,6 +21,32 @@ class WeatherService:
         'uncomfortable_humidity': 80  # % (if available)
     }
 
+    # Variables fetched per ensemble member: result key -> Meteomatics parameter
+    ENSEMBLE_PARAMETERS = {
+        'temperature': 't_2m:C',
+        'wind_speed': 'wind_speed_10m:ms',
+        'rainfall': 'precip_24h:mm'
+    }
+
+    # Exceedance conditions: (variable, threshold name, direction)
+    # direction 1 means value >= threshold, -1 means value <= threshold
+    ENSEMBLE_CONDITIONS = [
+        ('temperature', 'very_hot', 1),
+        ('temperature', 'very_cold', -1),
+        ('wind_speed', 'very_windy', 1),
+        ('rainfall', 'very_wet', 1)
+    ]
+
+    # Complementary "good" outcome for each variable
+    ENSEMBLE_COMPLEMENTS = {
+        'temperature': 'comfortable',
+        'wind_speed': 'calm',
+        'rainfall': 'dry'
+    }
+
+    # z-score for 95% Wilson confidence bands
+    CONFIDENCE_Z = 1.96
+
     def fetch_weather_data(self, lat, lon):
         """
         Fetch weather data from Meteomatics API
@@ -179,43 +207,16 @@ class WeatherService:
         if not self.username or not self.password:
             raise ValueError("Meteomatics API credentials not configured")
         
-        # Parse target date
-        try:
-            target_date = datetime.strptime(target_date_str, "%Y-%m-%d")
-        except ValueError:
-            raise ValueError("Invalid date format. Use YYYY-MM-DD")
-        
-        # Check if target date is in the future
-        now = datetime.utcnow()
-        if target_date < now.replace(hour=0, minute=0, second=0, microsecond=0):
-            raise ValueError("Target date must be in the future for forecast analysis")
-        
-        # Calculate days until target
-        days_until_target = (target_date - now).days
-        
-        # Limit to API forecast capabilities (typically 30 days)
-        if days_until_target > 30:
-            raise ValueError("Target date is too far in future. Maximum 30 days ahead.")
-        
-        # Fetch forecast data for multiple days around target date
         # Get target day plus/minus range (e.g., 3 days before and after)
-        range_days = min(days_range, days_until_target, 7)  # Max 7 days range
+        days_until_target, time_strings = self._forecast_window(
+            target_date_str, min(days_range, 7), max_days_ahead=30  # Max 7 days range
+        )
         
         forecast_temps = []
         forecast_winds = []
         forecast_rainfall = []
-        time_strings = []
         forecast_details = []
         
-        # Collect forecast data for the date range
-        start_day = max(0, days_until_target - range_days // 2)
-        end_day = min(30, days_until_target + range_days // 2 + 1)
-        
-        for day_offset in range(start_day, end_day):
-            forecast_date = now + timedelta(days=day_offset)
-            forecast_date = forecast_date.replace(hour=12, minute=0, second=0, microsecond=0)
-            time_strings.append(forecast_date.isoformat() + 'Z')
-        
         timestamps = ','.join(time_strings)
         parameters = 't_2m:C,wind_speed_10m:ms,precip_24h:mm,weather_symbol_1h:idx'
         url = f"{self.base_url}/{timestamps}/{parameters}/{lat},{lon}/json"
@@ -288,6 +289,294 @@ class WeatherService:
         except (KeyError, IndexError) as e:
             raise Exception(f"Error parsing forecast data: {str(e)}")
     
+    def fetch_ensemble_probability(self, lat, lon, target_date_str, days_range=7):
+        """
+        Fetch all ensemble members for the window around the target date
+        and compute exceedance probabilities from the member spread
+
+        Args:
+            lat, lon: Location coordinates
+            target_date_str: Target date in format 'YYYY-MM-DD'
+            days_range: Number of days around target date to analyze (default 7, max 30),
+                        clipped to the ensemble model's forecast horizon
+
+        Returns: Dictionary with per-day and whole-window probabilities and confidence bands
+        """
+        if not self.username or not self.password:
+            raise ValueError("Meteomatics API credentials not configured")
+
+        # Ensemble models stop well short of 30 days (ecmwf-ens reaches 360h).
+        # The horizon is exclusive: noon on day offset horizon - 1 is at most
+        # 24 * horizon hours after the latest run, even if that is yesterday's 12Z
+        model = Config.METEOMATICS_ENSEMBLE_MODEL
+        members = Config.METEOMATICS_ENSEMBLE_MEMBERS
+        horizon = min(Config.METEOMATICS_ENSEMBLE_HORIZON_DAYS, 31)
+        days_until_target, time_strings = self._forecast_window(
+            target_date_str, min(days_range, 30), max_days_ahead=horizon - 1
+        )
+
+        # One request for every member, variable and day in the window
+        timestamps = ','.join(time_strings)
+        parameters = ','.join(self.ENSEMBLE_PARAMETERS.values())
+        url = (
+            f"{self.base_url}/{timestamps}/{parameters}/{lat},{lon}/json"
+            f"?model={model}&ens_select=member:0-{members - 1}"
+        )
+
+        try:
+            response = requests.get(
+                url,
+                auth=HTTPBasicAuth(self.username, self.password),
+                timeout=30
+            )
+            response.raise_for_status()
+            data = response.json()
+
+            values, dates, member_ids = self._build_ensemble_array(data.get('data', []), members)
+
+        except requests.exceptions.RequestException as e:
+            raise Exception(f"Error fetching ensemble data: {str(e)}")
+        except (KeyError, IndexError, TypeError, AttributeError, ValueError) as e:
+            raise Exception(f"Error parsing ensemble data: {str(e)}")
+
+        result = {
+            'location': {'lat': lat, 'lon': lon},
+            'target_date': target_date_str,
+            'days_analyzed': len(dates),
+            'analysis_type': 'ensemble',
+            'model': model,
+            'ensemble_members': len(member_ids),
+            'days_until_event': days_until_target,
+            'dates': dates
+        }
+        result.update(self._calculate_ensemble_probabilities(values, dates))
+
+        return result
+
+    def _forecast_window(self, target_date_str, range_days, max_days_ahead):
+        """
+        Validate the target date and build the noon UTC timestamps for a
+        window of range_days centred on it (clipped to today..max_days_ahead)
+        Returns: (days_until_target, time_strings)
+        """
+        # Parse target date
+        try:
+            target_date = datetime.strptime(target_date_str, "%Y-%m-%d")
+        except ValueError:
+            raise ValueError("Invalid date format. Use YYYY-MM-DD")
+        
+        # Check if target date is in the future
+        now = datetime.utcnow()
+        if target_date.date() < now.date():
+            raise ValueError("Target date must be in the future for forecast analysis")
+        
+        # Whole calendar days until target: today is 0, tomorrow is 1
+        days_until_target = (target_date.date() - now.date()).days
+        
+        # Limit to API forecast capabilities
+        if days_until_target > max_days_ahead:
+            raise ValueError(
+                f"Target date is too far in future. Maximum {max_days_ahead} days ahead."
+            )
+        
+        # range_days // 2 days before the target, the rest on and after it
+        start_day = max(0, days_until_target - range_days // 2)
+        end_day = min(max_days_ahead + 1, days_until_target + range_days - range_days // 2)
+        
+        time_strings = []
+        for day_offset in range(start_day, end_day):
+            forecast_date = now + timedelta(days=day_offset)
+            forecast_date = forecast_date.replace(hour=12, minute=0, second=0, microsecond=0)
+            time_strings.append(forecast_date.isoformat() + 'Z')
+        
+        return days_until_target, time_strings
+
+    def _build_ensemble_array(self, series, expected_members):
+        """
+        Arrange the Meteomatics ensemble response into a
+        variables x members x days array (missing values are NaN)
+        Raises if a series has no member tag, the member count differs
+        from expected_members, or the payload holds no usable data
+        Returns: (values, dates, member_ids)
+        """
+        variable_index = {
+            parameter: i for i, parameter in enumerate(self.ENSEMBLE_PARAMETERS.values())
+        }
+
+        rows = []
+        member_ids = []
+        dates = []
+        for param in series:
+            # Ensemble series are named e.g. 't_2m:C-member:12'
+            name, _, member = param['parameter'].partition('-member:')
+            if name not in variable_index:
+                continue
+            if not member.isdigit():
+                raise Exception(
+                    f"Error parsing ensemble data: missing member tag in '{param['parameter']}'"
+                )
+            member = int(member)
+            if member not in member_ids:
+                member_ids.append(member)
+
+            date_entries = param['coordinates'][0]['dates']
+            if not dates:
+                dates = [entry['date'] for entry in date_entries]
+            rows.append((
+                variable_index[name],
+                member,
+                [entry['value'] for entry in date_entries]
+            ))
+
+        if not member_ids or not dates:
+            raise Exception("Error parsing ensemble data: response contains no ensemble values")
+        if len(member_ids) != expected_members:
+            raise Exception(
+                f"Error parsing ensemble data: expected {expected_members} members, "
+                f"got {len(member_ids)}"
+            )
+
+        member_ids.sort()
+        member_index = {member: i for i, member in enumerate(member_ids)}
+
+        values = np.full((len(variable_index), len(member_ids), len(dates)), np.nan)
+        for var, member, row in rows:
+            values[var, member_index[member], :len(row)] = np.array(row[:len(dates)], dtype=float)
+
+        # Meteomatics flags invalid or unavailable values with -666 / -999
+        values[values <= -666] = np.nan
+
+        return values, dates, member_ids
+
+    def _calculate_ensemble_probabilities(self, values, dates):
+        """
+        Calculate exceedance probabilities and 95% Wilson confidence bands
+        for every threshold in one vectorized pass over the ensemble array
+
+        Per-day bands are exact Wilson intervals (each member is one trial).
+        The whole-window band is a conservative approximation: it treats each
+        member's exceedance rate over the window as one trial and does not
+        measure the spread between members. Rates in [0, 1] with mean p have
+        variance at most p(1-p), so the band is at least about as wide as
+        one built from the observed member spread
+        """
+        variables = list(self.ENSEMBLE_PARAMETERS.keys())
+        var_idx = np.array([variables.index(c[0]) for c in self.ENSEMBLE_CONDITIONS])
+        thresholds = np.array([self.THRESHOLDS[c[1]] for c in self.ENSEMBLE_CONDITIONS], dtype=float)
+        direction = np.array([c[2] for c in self.ENSEMBLE_CONDITIONS], dtype=float)
+
+        # conditions x members x days
+        selected = values[var_idx]
+        valid = ~np.isnan(selected)
+        exceed = (selected * direction[:, None, None]) >= (thresholds * direction)[:, None, None]
+
+        # Per-day counts are (conditions x days); members are independent trials
+        hits = exceed.sum(axis=1)
+        totals = valid.sum(axis=1)
+        daily_prob, daily_lower, daily_upper = self._wilson_interval(hits, totals)
+
+        # Days within a member are correlated, so the window band uses
+        # n = member count with fractional hits (see docstring)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            member_rates = exceed.sum(axis=2) / valid.sum(axis=2)
+        window_members = (~np.isnan(member_rates)).sum(axis=1)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            window_rate = np.nanmean(member_rates, axis=1)
+        window_prob, window_lower, window_upper = self._wilson_interval(
+            window_rate * window_members, window_members
+        )
+
+        # Member spread per variable and day (percentiles x variables x days)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            spread = np.nanpercentile(values, [10, 50, 90], axis=1)
+            flat = values.reshape(len(variables), -1)
+            summary = {
+                'mean': np.nanmean(flat, axis=1),
+                'median': np.nanmedian(flat, axis=1),
+                'min': np.nanmin(flat, axis=1),
+                'max': np.nanmax(flat, axis=1),
+                # Sample SD, matching statistics.stdev in forecast mode
+                'std_dev': np.nanstd(flat, axis=1, ddof=1)
+            }
+        summary = {k: self._to_list(v, 2) for k, v in summary.items()}
+
+        daily_prob = self._to_list(daily_prob * 100, 1)
+        daily_lower = self._to_list(daily_lower * 100, 1)
+        daily_upper = self._to_list(daily_upper * 100, 1)
+        window_prob = self._to_list(window_prob * 100, 1)
+        window_lower = self._to_list(window_lower * 100, 1)
+        window_upper = self._to_list(window_upper * 100, 1)
+        spread = self._to_list(spread, 2)
+
+        result = {}
+        for v, variable in enumerate(variables):
+            result[variable] = {
+                **{k: summary[k][v] for k in summary},
+                'probabilities': {},
+                'confidence_bands': {},
+                'daily': [
+                    {
+                        'date': date,
+                        'p10': spread[0][v][d],
+                        'p50': spread[1][v][d],
+                        'p90': spread[2][v][d],
+                        'probabilities': {},
+                        'confidence_bands': {}
+                    }
+                    for d, date in enumerate(dates)
+                ]
+            }
+
+        for c, (variable, name, _) in enumerate(self.ENSEMBLE_CONDITIONS):
+            entry = result[variable]
+            entry['probabilities'][name] = window_prob[c]
+            entry['confidence_bands'][name] = {
+                'lower': window_lower[c],
+                'upper': window_upper[c]
+            }
+            for d, day in enumerate(entry['daily']):
+                day['probabilities'][name] = daily_prob[c][d]
+                day['confidence_bands'][name] = {
+                    'lower': daily_lower[c][d],
+                    'upper': daily_upper[c][d]
+                }
+
+        # Complementary outcome is whatever is left after the adverse conditions
+        for variable, name in self.ENSEMBLE_COMPLEMENTS.items():
+            entry = result[variable]
+            for target in [entry] + entry['daily']:
+                adverse = list(target['probabilities'].values())
+                if None in adverse:
+                    target['probabilities'][name] = None
+                else:
+                    target['probabilities'][name] = round(100 - sum(adverse), 1)
+
+        return result
+
+    def _wilson_interval(self, hits, totals):
+        """Wilson score interval for hits/totals (arrays); NaN where totals is 0"""
+        z = self.CONFIDENCE_Z
+        hits = np.asarray(hits, dtype=float)
+        totals = np.asarray(totals, dtype=float)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p = hits / totals
+            denom = 1 + z ** 2 / totals
+            centre = (p + z ** 2 / (2 * totals)) / denom
+            half_width = z * np.sqrt(p * (1 - p) / totals + z ** 2 / (4 * totals ** 2)) / denom
+
+        lower = np.clip(centre - half_width, 0, 1)
+        upper = np.clip(centre + half_width, 0, 1)
+        return p, lower, upper
+
+    def _to_list(self, array, ndigits):
+        """Round a NumPy array and convert it to JSON-safe nested lists (NaN -> None)"""
+        rounded = np.round(array, ndigits).astype(object)
+        rounded[np.isnan(np.asarray(array, dtype=float))] = None
+        return rounded.tolist()
+
     def _calculate_probabilities(self, values, data_type):
         """Calculate statistical probabilities for weather conditions"""
         if not values or len(values) == 0:
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make backend modules (config, services, utils) importable from any cwd
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,289 @@
+import os
+import statistics
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from services.weather_service import WeatherService
+
+
+PARAMETERS = ['t_2m:C', 'wind_speed_10m:ms', 'precip_24h:mm']
+
+
+def make_series(parameter, values, member=None):
+    """Build one Meteomatics JSON series, tagged with a member if given"""
+    name = parameter if member is None else f"{parameter}-member:{member}"
+    return {
+        'parameter': name,
+        'coordinates': [{
+            'lat': 27.7,
+            'lon': 85.3,
+            'dates': [
+                {'date': f"2030-01-{day + 1:02d}T12:00:00Z", 'value': value}
+                for day, value in enumerate(values)
+            ]
+        }]
+    }
+
+
+def make_response(payload):
+    response = mock.Mock()
+    response.json.return_value = payload
+    return response
+
+
+def random_payload(days, members, seed=0):
+    """Normally distributed values for every member, variable and day"""
+    rng = np.random.default_rng(seed)
+    data = []
+    for parameter, mean, spread in zip(PARAMETERS, [30, 8, 4], [6, 5, 6]):
+        for member in range(members):
+            values = rng.normal(mean, spread, days).tolist()
+            data.append(make_series(parameter, values, member))
+    return {'data': data}
+
+
+def future_date(days):
+    return (datetime.utcnow() + timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+@pytest.fixture
+def service():
+    service = WeatherService()
+    service.username = 'user'
+    service.password = 'secret'
+    return service
+
+
+@pytest.fixture
+def ensemble_config():
+    with mock.patch('services.weather_service.Config') as config:
+        config.METEOMATICS_ENSEMBLE_MODEL = 'ecmwf-ens'
+        config.METEOMATICS_ENSEMBLE_MEMBERS = 51
+        config.METEOMATICS_ENSEMBLE_HORIZON_DAYS = 15
+        yield config
+
+
+def request_offsets(url):
+    """Day offsets from today for every timestamp in a Meteomatics URL"""
+    today = datetime.utcnow().date()
+    return [
+        (datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ').date() - today).days
+        for timestamp in url.split('/')[3].split(',')
+    ]
+
+
+@pytest.mark.parametrize('days_ahead, days_range, offsets', [
+    (0, 7, [0, 1, 2, 3]),
+    (1, 7, [0, 1, 2, 3, 4]),
+    (10, 7, [7, 8, 9, 10, 11, 12, 13]),
+    (10, 6, [7, 8, 9, 10, 11, 12]),
+    (10, 30, [7, 8, 9, 10, 11, 12, 13]),
+    (30, 7, [27, 28, 29, 30]),
+])
+def test_fetch_forecast_probability_window(service, days_ahead, days_range, offsets):
+    with mock.patch(
+        'services.weather_service.requests.get', return_value=make_response({'data': []})
+    ) as get:
+        result = service.fetch_forecast_probability(
+            27.7, 85.3, future_date(days_ahead), days_range
+        )
+
+    # Calendar days: today is 0, tomorrow is 1
+    assert result['days_until_event'] == days_ahead
+    # Centred on the target, at most 7 days, clipped to today..30
+    assert request_offsets(get.call_args[0][0]) == offsets
+
+
+def test_fetch_forecast_probability_rejects_beyond_30_days(service):
+    with pytest.raises(ValueError, match='Maximum 30 days ahead'):
+        service.fetch_forecast_probability(27.7, 85.3, future_date(31))
+
+
+def test_build_ensemble_array_from_member_series(service):
+    series = [
+        make_series('t_2m:C', [20.0, -999, 22.0], member=1),
+        make_series('t_2m:C', [10.0, 11.0, -666], member=0),
+        make_series('wind_speed_10m:ms', [5.0, None, 7.0], member=0),
+        make_series('wind_speed_10m:ms', [1.0, 2.0, 3.0], member=1),
+        make_series('weather_symbol_1h:idx', [1, 2, 3], member=0),
+    ]
+
+    values, dates, member_ids = service._build_ensemble_array(series, expected_members=2)
+
+    assert values.shape == (3, 2, 3)
+    assert member_ids == [0, 1]
+    assert dates[0] == '2030-01-01T12:00:00Z'
+    np.testing.assert_array_equal(values[0, 0], [10.0, 11.0, np.nan])
+    np.testing.assert_array_equal(values[0, 1], [20.0, np.nan, 22.0])
+    np.testing.assert_array_equal(values[1, 0], [5.0, np.nan, 7.0])
+    # Rainfall was not in the payload
+    assert np.isnan(values[2]).all()
+
+
+def test_build_ensemble_array_rejects_untagged_series(service):
+    series = [make_series('t_2m:C', [20.0]) for _ in range(51)]
+
+    with pytest.raises(Exception, match='missing member tag'):
+        service._build_ensemble_array(series, expected_members=51)
+
+
+def test_build_ensemble_array_rejects_member_count_mismatch(service):
+    series = [make_series('t_2m:C', [20.0], member=m) for m in range(10)]
+
+    with pytest.raises(Exception, match='expected 51 members, got 10'):
+        service._build_ensemble_array(series, expected_members=51)
+
+
+def test_wilson_interval_known_values(service):
+    p, lower, upper = service._wilson_interval([5, 0, 10], [10, 10, 10])
+
+    np.testing.assert_allclose(p, [0.5, 0.0, 1.0])
+    np.testing.assert_allclose(lower, [0.2366, 0.0, 0.7225], atol=1e-4)
+    np.testing.assert_allclose(upper, [0.7634, 0.2775, 1.0], atol=1e-4)
+
+
+def test_wilson_interval_zero_totals(service):
+    p, lower, upper = service._wilson_interval([0], [0])
+
+    assert np.isnan(p).all() and np.isnan(lower).all() and np.isnan(upper).all()
+
+
+def test_ensemble_probabilities_direction_and_complements(service):
+    # 4 members x 2 days: day 0 has one freezing member, day 1 has two hot ones
+    values = np.full((3, 4, 2), np.nan)
+    values[0] = [[-1.0, 36.0], [5.0, 35.0], [10.0, 20.0], [20.0, 20.0]]
+    values[1] = [[2.0, 2.0], [2.0, 2.0], [2.0, 2.0], [16.0, 2.0]]
+    values[2] = [[0.0, 0.0], [0.0, 0.0], [0.0, 0.0], [0.0, 0.0]]
+
+    result = service._calculate_ensemble_probabilities(values, ['d0', 'd1'])
+
+    temperature = result['temperature']
+    # very_cold counts values <= 0 °C, very_hot counts values >= 35 °C
+    assert temperature['daily'][0]['probabilities'] == {
+        'very_hot': 0.0, 'very_cold': 25.0, 'comfortable': 75.0
+    }
+    assert temperature['daily'][1]['probabilities'] == {
+        'very_hot': 50.0, 'very_cold': 0.0, 'comfortable': 50.0
+    }
+    assert temperature['probabilities'] == {
+        'very_hot': 25.0, 'very_cold': 12.5, 'comfortable': 62.5
+    }
+    assert result['wind_speed']['probabilities'] == {'very_windy': 12.5, 'calm': 87.5}
+    assert result['rainfall']['probabilities'] == {'very_wet': 0.0, 'dry': 100.0}
+    assert temperature['daily'][0]['p50'] == 7.5
+
+
+def test_window_band_uses_member_count(service):
+    # 10 of 51 members are very hot on all 30 days, the rest never are
+    values = np.zeros((3, 51, 30))
+    values[0, :10] = 40.0
+    values[0, 10:] = 20.0
+
+    result = service._calculate_ensemble_probabilities(values, [str(d) for d in range(30)])
+
+    # Wilson, 10 hits in n = 51 members (pooling 1530 member-days gives 17.7-21.7)
+    assert result['temperature']['probabilities']['very_hot'] == 19.6
+    assert result['temperature']['confidence_bands']['very_hot'] == {
+        'lower': 11.0, 'upper': 32.5
+    }
+
+
+@pytest.mark.parametrize('payload', [{'data': []}, {}, [], {'data': [{'parameter': 't_2m:C-member:0'}]}])
+def test_fetch_ensemble_rejects_empty_or_malformed_payload(service, ensemble_config, payload):
+    with mock.patch('services.weather_service.requests.get', return_value=make_response(payload)):
+        with pytest.raises(Exception, match='Error parsing ensemble data') as error:
+            service.fetch_ensemble_probability(27.7, 85.3, future_date(5))
+
+    # Must not surface as a ValueError (the endpoint maps those to 400)
+    assert not isinstance(error.value, ValueError)
+
+
+def test_fetch_ensemble_rejects_date_at_horizon(service, ensemble_config):
+    # The horizon is exclusive: with 15 days, offset 15 is already out of range
+    with pytest.raises(ValueError, match='Maximum 14 days ahead'):
+        service.fetch_ensemble_probability(27.7, 85.3, future_date(15))
+
+
+def test_fetch_ensemble_window_stays_inside_horizon(service, ensemble_config):
+    calls = []
+
+    def fake_get(url, auth, timeout):
+        calls.append(url)
+        return make_response(random_payload(len(request_offsets(url)), 51))
+
+    with mock.patch('services.weather_service.requests.get', side_effect=fake_get):
+        service.fetch_ensemble_probability(27.7, 85.3, future_date(14), days_range=30)
+
+    timestamps = calls[0].split('/')[3].split(',')
+    last = datetime.strptime(timestamps[-1], '%Y-%m-%dT%H:%M:%SZ')
+    today_00z = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    # ecmwf-ens reaches 360h; stay inside it even from yesterday's 12Z run
+    assert last - (today_00z - timedelta(hours=12)) <= timedelta(hours=360)
+    assert len(timestamps) == 15
+
+
+def test_fetch_ensemble_requests_all_members(service, ensemble_config):
+    calls = []
+
+    def fake_get(url, auth, timeout):
+        calls.append(url)
+        return make_response(random_payload(len(request_offsets(url)), 51))
+
+    with mock.patch('services.weather_service.requests.get', side_effect=fake_get):
+        result = service.fetch_ensemble_probability(27.7, 85.3, future_date(7), days_range=30)
+
+    assert len(calls) == 1
+    assert calls[0].endswith('?model=ecmwf-ens&ens_select=member:0-50')
+    assert result['analysis_type'] == 'ensemble'
+    assert result['ensemble_members'] == 51
+    # Offsets 0-14: clipped to today and to the 15-day horizon
+    assert result['days_analyzed'] == 15
+    assert len(result['temperature']['daily']) == 15
+
+
+def test_ensemble_statistics_are_vectorized(service):
+    # Cost must not grow a Python loop per member: the same two Wilson calls
+    # cover every condition, member and day
+    values, dates, _ = service._build_ensemble_array(
+        random_payload(30, 51)['data'], expected_members=51
+    )
+
+    with mock.patch.object(
+        service, '_wilson_interval', wraps=service._wilson_interval
+    ) as wilson:
+        service._calculate_ensemble_probabilities(values, dates)
+
+    conditions = len(service.ENSEMBLE_CONDITIONS)
+    assert wilson.call_count == 2
+    assert np.shape(wilson.call_args_list[0][0][0]) == (conditions, 30)
+    assert np.shape(wilson.call_args_list[1][0][0]) == (conditions,)
+
+
+@pytest.mark.skipif(
+    not os.getenv('RUN_BENCHMARKS'), reason='benchmark; set RUN_BENCHMARKS=1 to run'
+)
+def test_benchmark_fetch_ensemble_full_size(service, ensemble_config):
+    ensemble_config.METEOMATICS_ENSEMBLE_HORIZON_DAYS = 31
+    # 51 members x 30 days x 3 variables, parsing and statistics included
+    payload = random_payload(30, 51)
+
+    with mock.patch('services.weather_service.requests.get', return_value=make_response(payload)):
+        start = time.perf_counter()
+        for _ in range(10):
+            service.fetch_ensemble_probability(27.7, 85.3, future_date(15), days_range=30)
+        elapsed = (time.perf_counter() - start) / 10
+
+    assert elapsed < 0.25
+
+
+def test_ensemble_std_dev_is_sample_std_dev(service):
+    values = np.full((3, 2, 2), np.nan)
+    values[0] = [[10.0, 12.0], [14.0, 16.0]]
+
+    result = service._calculate_ensemble_probabilities(values, ['d0', 'd1'])
+
+    assert result['temperature']['std_dev'] == round(statistics.stdev([10, 12, 14, 16]), 2)